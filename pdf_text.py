@@ -0,0 +1,93 @@
+# Text normalization and per-page extraction, kept out of app.py so the
+# extraction workers can import them (Streamlit re-creates app.py's module
+# on every run, so its functions cannot be pickled by reference).
+import contextlib
+import fitz  # PyMuPDF
+import os
+import string
+import tempfile
+import unidecode
+
+
+# -------------------------------------------------
+# TEXT NORMALIZATION
+# -------------------------------------------------
+# Bump whenever normalize_text, its tables or PDF_TEXT_FLAGS change so the
+# cached text of earlier uploads is re-extracted.
+TEXT_VERSION = 1
+
+# Characters that routinely show up in scientific PDFs, folded the same way
+# unidecode would; anything else non-ASCII still goes through unidecode.
+COMMON_ACCENT_MAP = {
+    "à": "a", "á": "a", "â": "a", "ã": "a", "ä": "a", "å": "a", "æ": "ae",
+    "ç": "c", "è": "e", "é": "e", "ê": "e", "ë": "e",
+    "ì": "i", "í": "i", "î": "i", "ï": "i", "ñ": "n",
+    "ò": "o", "ó": "o", "ô": "o", "õ": "o", "ö": "o", "ø": "o",
+    "ù": "u", "ú": "u", "û": "u", "ü": "u", "ý": "y", "ÿ": "y", "ß": "ss",
+    "µ": "u", "μ": "m", "α": "a", "β": "b", "γ": "g", "δ": "d", "κ": "k",
+    "°": "deg", "±": "+-", "×": "x", "–": "-", "—": "--",
+    "‘": "'", "’": "'", "“": '"', "”": '"', "\u00a0": " ",
+    "ﬁ": "fi", "ﬂ": "fl", "ﬀ": "ff", "ﬃ": "ffi", "ﬄ": "ffl",
+}
+ACCENT_TABLE = str.maketrans(COMMON_ACCENT_MAP)
+# Blanks every ASCII code point outside [a-z0-9\s] in one C-level pass.
+ALLOWED_CHARS = set(string.ascii_lowercase + string.digits + string.whitespace)
+STRIP_TABLE = {cp: " " for cp in range(128) if chr(cp) not in ALLOWED_CHARS}
+
+
+def normalize_text(text):
+    text = text.lower().translate(ACCENT_TABLE)
+    if not text.isascii():
+        text = unidecode.unidecode(text).lower()
+    text = text.translate(STRIP_TABLE)
+    return " ".join(text.split())
+
+
+# -------------------------------------------------
+# PAGE EXTRACTION
+# -------------------------------------------------
+# Plain-text extraction with hyphenated line breaks joined by MuPDF. Leaving
+# out the ligature/whitespace preservation flags of the default also has
+# MuPDF expand ligatures before normalize_text sees them.
+PDF_TEXT_FLAGS = fitz.TEXT_DEHYPHENATE | fitz.TEXT_MEDIABOX_CLIP | fitz.TEXT_CID_FOR_UNKNOWN_UNICODE
+
+
+def join_pages(pages):
+    # Pages are normalized one at a time, so no full-document copy is made
+    # per normalization step; normalize_text is stable under this join.
+    return " ".join(page for page in pages if page)
+
+
+# Above this size the PDF is written once to a temporary file that workers
+# open by path (read from disk by MuPDF) instead of receiving the whole
+# upload pickled into every task.
+SPOOL_TO_DISK_BYTES = 8 * 1024 * 1024
+
+
+@contextlib.contextmanager
+def worker_source(pdf_bytes):
+    if len(pdf_bytes) <= SPOOL_TO_DISK_BYTES:
+        yield pdf_bytes
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "upload.pdf")
+        with open(path, "wb") as f:
+            f.write(pdf_bytes)
+        yield path
+
+
+def open_pdf(source):
+    if isinstance(source, str):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def extract_page_range(args):
+    # PyMuPDF documents are not picklable, so each worker reopens the source
+    # (the upload bytes or the path of their spooled copy).
+    source, start, stop = args
+    doc = open_pdf(source)
+    text = join_pages(normalize_text(doc[i].get_text("text", flags=PDF_TEXT_FLAGS))
+                      for i in range(start, stop))
+    doc.close()
+    return text
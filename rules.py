@@ -0,0 +1,369 @@
+# SciRAP rule tables and the keyword scanner built from them. Kept out of
+# app.py, which Streamlit re-executes on every rerun, so the tables and the
+# scanner database are built once per process.
+import numpy as np
+
+try:
+    import hyperscan
+except ImportError:  # optional, wheels only exist for some platforms
+    hyperscan = None
+
+try:
+    import ahocorasick
+except ImportError:  # fall back to plain substring checks in scan_keywords
+    ahocorasick = None
+
+
+# -------------------------------------------------
+# REPORTING QUALITY RULES (RQ1–RQ24)
+# -------------------------------------------------
+RQ_RULES = {
+    "RQ1": {"question": "Chemical name or identification was given",
+            "strong": ["cas", "chemical name", "cas number", "iupac", "molecular formula", "structure"],
+            "weak": ["test compound", "compound", "chemical obtained", "purchased from"]},
+
+    "RQ2": {"question": "Purity was stated or traceable",
+            "strong": ["high purity", "certificate of analysis", "hplc", "99%", "batch number", "lot number"],
+            "weak": ["purity", "purchased from", "supplied by"]},
+
+    "RQ3": {"question": "Solubility was described",
+            "strong": ["solubility", "soluble in", "solubility test"],
+            "weak": ["dissolved", "prepared in"]},
+
+    "RQ4": {"question": "Solvent (vehicle) was described",
+            "strong": ["dmso", "ethanol", "pbs", "solvent", "vehicle"],
+            "weak": ["carrier"]},
+
+    "RQ5": {"question": "Solvent (vehicle) control included",
+            "strong": ["vehicle control", "solvent control"],
+            "weak": ["control group"]},
+
+    "RQ6": {"question": "Test system described",
+            "strong": ["cell line", "primary cells", "tissue", "organ culture", "embryo"],
+            "weak": ["cells used", "in vitro model"]},
+
+    "RQ7": {"question": "Source of test system stated",
+            "strong": ["atcc", "supplier", "catalog number", "cat no"],
+            "weak": ["obtained from", "purchased from"]},
+
+    "RQ8": {"question": "Metabolic competence described",
+            "strong": ["cyp450", "s9 fraction", "metabolic activation"],
+            "weak": ["metabolize", "biotransformation"]},
+
+    "RQ9": {"question": "Cell passage number stated",
+            "strong": ["passage", "p#", "passage number"],
+            "weak": ["subcultured"]},
+
+    "RQ10": {"question": "Media composition described",
+             "strong": ["dmem", "rpmi", "fbs", "serum", "antibiotic"],
+             "weak": ["media", "culture medium"]},
+
+    "RQ11": {"question": "Incubation conditions described",
+             "strong": ["37c", "co2", "humidity", "incubator"],
+             "weak": ["room temperature"]},
+
+    "RQ12": {"question": "Contamination control described",
+             "strong": ["mycoplasma", "contamination check", "sterility test"],
+             "weak": ["sterile conditions"]},
+
+    "RQ13": {"question": "Dose levels stated",
+             "strong": ["um", "mm", "mg ml", "concentration", "dose"],
+             "weak": ["treated with"]},
+
+    "RQ14": {"question": "Cell density or number stated",
+             "strong": ["cells well", "seeding density", "cell density"],
+             "weak": ["cells plated"]},
+
+    "RQ15": {"question": "Duration of treatment stated",
+             "strong": ["24h", "48h", "72h", "exposure time"],
+             "weak": ["overnight"]},
+
+    "RQ16": {"question": "Number of replicates stated",
+             "strong": ["replicates", "n=", "triplicate", "independent"],
+             "weak": ["repeated"]},
+
+    "RQ17": {"question": "Methods sufficiently described",
+             "strong": ["protocol", "procedure", "assay method", "analytical method"],
+             "weak": ["as previously described"]},
+
+    "RQ18": {"question": "Time points stated",
+             "strong": ["time point", "collected at", "measured at"],
+             "weak": ["over time"]},
+
+    "RQ19": {"question": "Cytotoxicity measured",
+             "strong": ["mtt", "viability", "cytotoxicity", "ldh"],
+             "weak": ["cell death"]},
+
+    "RQ20": {"question": "Results clearly presented",
+             "strong": ["figure", "table", "results"],
+             "weak": ["data shown"]},
+
+    "RQ21": {"question": "Statistical methods described",
+             "strong": ["anova", "t test", "p value", "graphpad"],
+             "weak": ["statistics"]},
+
+    "RQ22": {"question": "Funding sources stated",
+             "strong": ["funded by", "supported by", "grant"],
+             "weak": ["financial support"]},
+
+    "RQ23": {"question": "Competing interests disclosed",
+             "strong": [
+                 "no conflict of interest",
+                 "no conflicts of interest",
+                 "the authors declare no conflict",
+                 "the authors declare that they have no conflict of interest",
+                 "no competing interests",
+                 "none declared",
+                 "no financial conflict",
+                 "no competing financial interests"
+             ],
+             "weak": ["conflict of interest", "competing interest"]},
+
+    "RQ24": {"question": "Indispensable information provided",
+             "strong": [], "weak": []}
+}
+
+
+# -------------------------------------------------
+# METHOD QUALITY RULES (MQ1–MQ16)
+# -------------------------------------------------
+MQ_RULES = {
+    "MQ1": {"question": "Impurities unlikely to affect results",
+            "strong": ["high purity", "hplc", "99%", "no impurities"],
+            "weak": ["purity", "batch", "lot number"],
+            "contradict": ["impurities", "unknown purity"]},
+
+    "MQ2": {"question": "Compound likely soluble",
+            "strong": ["soluble", "solubility", "fully dissolved"],
+            "weak": ["dissolved"],
+            "contradict": ["insoluble", "precipitate"]},
+
+    "MQ3": {"question": "Appropriate solvent used",
+            "strong": ["dmso", "ethanol", "pbs"],
+            "weak": ["solvent"],
+            "contradict": ["toxic solvent"]},
+
+    "MQ4": {"question": "Solvent control included",
+            "strong": ["vehicle control", "solvent control"],
+            "weak": ["control group"],
+            "contradict": ["no control"]},
+
+    "MQ5": {"question": "Positive control included + expected effect",
+            "strong": ["positive control", "reference compound", "expected response"],
+            "weak": ["positive"],
+            "contradict": ["no positive control", "failed positive control"]},
+
+    "MQ6": {"question": "Reliable + sensitive test system",
+            "strong": ["validated model", "sensitive assay", "cyp450"],
+            "weak": ["cell line", "primary cells"],
+            "contradict": ["unreliable"]},
+
+    "MQ7": {"question": "Maintenance conditions appropriate",
+            "strong": ["37c", "co2", "dmem", "fbs", "mycoplasma free"],
+            "weak": ["incubation", "media"],
+            "contradict": ["contamination"]},
+
+    "MQ8": {"question": "Exposure duration suitable",
+            "strong": ["24h", "48h", "72h"],
+            "weak": ["treated for"],
+            "contradict": ["insufficient exposure"]},
+
+    "MQ9": {"question": "Concentrations suitable",
+            "strong": ["dose response", "range finding", "multiple concentrations"],
+            "weak": ["treated with"],
+            "contradict": ["irrelevant concentration", "excessive toxicity"]},
+
+    "MQ10": {"question": "Test conditions appropriate",
+             "strong": ["appropriate media", "serum", "cell density", "temperature"],
+             "weak": ["culture"],
+             "contradict": ["inappropriate conditions"]},
+
+    "MQ11": {"question": "Reliable analytical methods used",
+             "strong": ["validated method", "sensitivity", "lod", "standard method"],
+             "weak": ["method", "protocol"],
+             "contradict": ["unvalidated"]},
+
+    "MQ12": {"question": "Sufficient replicates",
+             "strong": ["n=", "triplicate", "biological replicates"],
+             "weak": ["replicated"],
+             "contradict": ["n=1", "single replicate"]},
+
+    "MQ13": {"question": "Suitable time points",
+             "strong": ["time course", "measured at", "multiple time points"],
+             "weak": ["over time"],
+             "contradict": ["inadequate time points"]},
+
+    "MQ14": {"question": "Cytotoxicity measured & acceptable",
+             "strong": ["mtt", "viability", "cytotoxicity", "noncytotoxic"],
+             "weak": ["cell death"],
+             "contradict": ["severe cytotoxicity"]},
+
+    "MQ15": {"question": "Statistical methods appropriate",
+             "strong": ["anova", "t test", "p value"],
+             "weak": ["statistics"],
+             "contradict": ["inappropriate statistics"]},
+
+    "MQ16": {"question": "Other reliability factors",
+             "strong": ["quality control", "validated"],
+             "weak": ["reliable"],
+             "contradict": ["bias", "experimental flaw"]}
+}
+
+
+# -------------------------------------------------
+# RELEVANCE RULES (R1–R4)
+# -------------------------------------------------
+R_RULES = {
+    "R1": {
+        "question": "Identity of the tested substance",
+        "direct": [
+            "pesticide", "insecticide", "herbicide", "fungicide",
+            "endocrine disruptor", "bisphenol", "phthalate", "flame retardant",
+            "metal", "lead", "arsenic", "cadmium", "mercury"
+        ],
+        "indirect": [
+            "industrial chemical", "environmental toxicant", "pollution exposure"
+        ],
+        "not_rel": [
+            "pharmaceutical drug", "antidepressant", "vitamin",
+            "nutraceutical", "nanomaterial", "hormone therapy", "food additive"
+        ]
+    },
+
+    "R2": {
+        "question": "Test system used",
+        "direct": [
+            "oligodendrocyte", "opc", "myelination", "cns development",
+            "prenatal", "perinatal", "early life", "white matter",
+            "developmental neurotoxicity"
+        ],
+        "indirect": ["neuron culture", "mixed glia", "primary brain cells"],
+        "not_rel": [
+            "cancer cell line", "glioblastoma", "hepg2", "a549",
+            "alzheimer", "parkinson", "ms", "adult neurodegeneration"
+        ]
+    },
+
+    "R3": {
+        "question": "Endpoint studied",
+        "direct": [
+            "myelin", "mbp", "olig2", "apoptosis", "oxidative stress",
+            "mitochondrial dysfunction", "ros", "cytokine",
+            "inflammation", "neurite outgrowth", "cell differentiation",
+            "developmental toxicity"
+        ],
+        "indirect": ["neurotoxicity", "viability", "cytotoxicity", "gene expression"],
+        "not_rel": [
+            "cancer proliferation", "tumor marker",
+            "alzheimer marker", "parkinson marker", "metabolic disease"
+        ]
+    },
+
+    "R4": {
+        "question": "Concentrations used",
+        "direct": ["nm", "µm", "low dose", "physiological dose"],
+        "indirect": ["high µm", "supraphysiological dose"],
+        "not_rel": ["mm", "millimolar", "extremely high dose", "cytotoxic concentration"]
+    }
+}
+
+
+# -------------------------------------------------
+# KEYWORD SCANNER
+# -------------------------------------------------
+KEYWORD_CATEGORIES = ("strong", "weak", "contradict", "direct", "indirect", "not_rel")
+
+# Bump whenever the rule tables change so cached scans are recomputed.
+# Extracted text is versioned the same way by pdf_text.TEXT_VERSION.
+RULES_VERSION = 1
+
+# Freeze every keyword list as a lowercase tuple: normalize_text lowercases
+# the document, so an uppercase keyword could never match.
+for rules in (RQ_RULES, MQ_RULES, R_RULES):
+    for rule in rules.values():
+        for category, keywords in rule.items():
+            if isinstance(keywords, list):
+                rule[category] = tuple(k.lower() for k in keywords)
+
+# Flat keyword table: one row per (rule, category, keyword), grouped by rule.
+# A scan marks matching rows in a boolean mask, and per-rule category hits
+# are one vectorized reduction over that mask.
+ALL_RULES = {**RQ_RULES, **MQ_RULES, **R_RULES}
+RULE_IDS = list(ALL_RULES)
+RULE_INDEX = {rule_id: i for i, rule_id in enumerate(RULE_IDS)}
+CATEGORY_INDEX = {category: i for i, category in enumerate(KEYWORD_CATEGORIES)}
+
+
+def build_keyword_table():
+    keywords, rule_idx, cat_idx = [], [], []
+    for rule_id, rule in ALL_RULES.items():
+        for category in KEYWORD_CATEGORIES:
+            for kw in rule.get(category, []):
+                keywords.append(kw)
+                rule_idx.append(RULE_INDEX[rule_id])
+                cat_idx.append(CATEGORY_INDEX[category])
+    return (np.array(keywords, dtype=object),
+            np.array(rule_idx, dtype=np.int16),
+            np.array(cat_idx, dtype=np.int8))
+
+
+KW_TABLE, KW_RULE, KW_CAT = build_keyword_table()
+RULE_ROWS = {rule_id: slice(np.searchsorted(KW_RULE, i, "left"), np.searchsorted(KW_RULE, i, "right"))
+             for i, rule_id in enumerate(RULE_IDS)}
+
+# Shared vocabulary: many keywords ("dmso", "viability", "anova", ...) are
+# used by several rules, so each distinct keyword is scanned for once and
+# its hit is fanned out to every table row that references it.
+KEYWORD_ROWS = {}
+for row, kw in enumerate(KW_TABLE):
+    KEYWORD_ROWS.setdefault(kw, []).append(row)
+UNIQUE_KW = sorted(KEYWORD_ROWS)
+
+
+if hyperscan is not None:
+    # Literal patterns with SINGLEMATCH: every keyword is reported at most once.
+    KEYWORD_DATABASE = hyperscan.Database()
+    KEYWORD_DATABASE.compile(expressions=[kw.encode("utf-8") for kw in UNIQUE_KW],
+                             ids=list(range(len(UNIQUE_KW))),
+                             elements=len(UNIQUE_KW),
+                             flags=hyperscan.HS_FLAG_SINGLEMATCH,
+                             literal=True)
+elif ahocorasick is not None:
+    KEYWORD_AUTOMATON = ahocorasick.Automaton()
+    for kw in UNIQUE_KW:
+        KEYWORD_AUTOMATON.add_word(kw, kw)
+    KEYWORD_AUTOMATON.make_automaton()
+
+
+def scan_keywords(text):
+    if hyperscan is not None:
+        # A fresh scratch space per call, so concurrent Streamlit sessions
+        # never scan with the same one.
+        found_ids = set()
+        KEYWORD_DATABASE.scan(text.encode("utf-8"),
+                              match_event_handler=lambda kw_id, *_: found_ids.add(kw_id),
+                              scratch=hyperscan.Scratch(KEYWORD_DATABASE))
+        found = {UNIQUE_KW[kw_id] for kw_id in found_ids}
+    elif ahocorasick is not None:
+        found = {kw for _, kw in KEYWORD_AUTOMATON.iter(text)}
+    else:
+        found = {kw for kw in UNIQUE_KW if kw in text}
+
+    hit_mask = np.zeros(len(KW_TABLE), dtype=bool)
+    for kw in found:
+        hit_mask[KEYWORD_ROWS[kw]] = True
+    return hit_mask
+
+
+def rule_category_hits(hit_mask):
+    per_rule = np.zeros((len(RULE_IDS), len(KEYWORD_CATEGORIES)), dtype=bool)
+    # OR-ing in True is idempotent, so a plain fancy-index store gives the
+    # same result as np.logical_or.at without ufunc.at's per-element overhead.
+    per_rule[KW_RULE[hit_mask], KW_CAT[hit_mask]] = True
+    return per_rule
+
+
+def rule_keyword_hits(rule_id, category, hit_mask):
+    rows = RULE_ROWS[rule_id]
+    in_category = KW_CAT[rows] == CATEGORY_INDEX[category]
+    return list(KW_TABLE[rows][hit_mask[rows] & in_category])